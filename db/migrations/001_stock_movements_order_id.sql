@@ -0,0 +1,16 @@
+-- =============================================================================
+-- Link stock movements to the order that caused them.
+--
+-- Reservation and release movements used to carry the order id inside the
+-- reason text ("reserve_order:<uuid>"). They now store it in order_id and use
+-- the short reasons 'reserve' / 'release'. Manual adjustments keep a NULL
+-- order_id. Safe to run more than once.
+-- =============================================================================
+
+ALTER TABLE stock_movements
+    ADD COLUMN IF NOT EXISTS order_id UUID NULL REFERENCES orders(id);
+
+-- Partial index: only movements tied to an order are ever looked up by order
+CREATE INDEX IF NOT EXISTS stock_movements_order_id_idx
+    ON stock_movements (order_id)
+    WHERE order_id IS NOT NULL;
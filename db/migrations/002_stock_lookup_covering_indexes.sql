@@ -0,0 +1,29 @@
+-- =============================================================================
+-- Covering index for the get_stock lookup.
+--
+-- get_stock reads products by sku and then stock by product_id. The UNIQUE
+-- constraint on products.sku is replaced by one that also carries id and
+-- name, so the products side is answered with an index-only scan (once
+-- (auto)vacuum marks the pages all-visible) without keeping a second index
+-- on sku. Products are rarely written, so the wider index costs little.
+--
+-- stock is deliberately left alone: putting quantity or updated_at into one
+-- of its indexes would make every stock UPDATE (add_stock, reservations,
+-- releases) non-HOT and rewrite the index entries on each write, to save a
+-- single heap fetch per read. Safe to run more than once.
+-- =============================================================================
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'products_sku_covering_key'
+    ) THEN
+        ALTER TABLE products
+            ADD CONSTRAINT products_sku_covering_key UNIQUE (sku) INCLUDE (id, name);
+        ALTER TABLE products DROP CONSTRAINT IF EXISTS products_sku_key;
+    END IF;
+END
+$$;
+
+-- Refresh the statistics so the planner considers the new index right away
+ANALYZE products;
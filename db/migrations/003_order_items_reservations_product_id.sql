@@ -0,0 +1,26 @@
+-- =============================================================================
+-- Store the product id on order items and reservations.
+--
+-- The SKU of an order item never changes, so the product it refers to can be
+-- resolved once when the order is created. Reservation and release then work
+-- from product_id directly, without looking each SKU up in products again.
+-- Existing rows are backfilled from their SKU. Safe to run more than once.
+-- =============================================================================
+
+ALTER TABLE order_items
+    ADD COLUMN IF NOT EXISTS product_id INTEGER REFERENCES products(id);
+
+ALTER TABLE reservations
+    ADD COLUMN IF NOT EXISTS product_id INTEGER REFERENCES products(id);
+
+UPDATE order_items oi
+SET product_id = p.id
+FROM products p
+WHERE p.sku = oi.sku
+AND oi.product_id IS NULL;
+
+UPDATE reservations r
+SET product_id = p.id
+FROM products p
+WHERE p.sku = r.sku
+AND r.product_id IS NULL;
@@ -0,0 +1,34 @@
+-- =============================================================================
+-- Publish order status changes on the 'orders' NOTIFY channel.
+--
+-- Every new order and every status transition (PENDING -> RESERVED -> PAID /
+-- CANCELLED / FAILED) sends {"id": ..., "status": ...} to listeners, so other
+-- workers can LISTEN orders instead of polling the table. Postgres delivers
+-- the notification only when the transaction commits. A trigger covers all
+-- the tool statements without having to touch each of them. Safe to run more
+-- than once.
+-- =============================================================================
+
+CREATE OR REPLACE FUNCTION notify_order_status() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'orders',
+        json_build_object('id', NEW.id, 'status', NEW.status)::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS orders_status_notify_insert ON orders;
+CREATE TRIGGER orders_status_notify_insert
+    AFTER INSERT ON orders
+    FOR EACH ROW
+    EXECUTE FUNCTION notify_order_status();
+
+-- Only fire when the status really changes
+DROP TRIGGER IF EXISTS orders_status_notify_update ON orders;
+CREATE TRIGGER orders_status_notify_update
+    AFTER UPDATE OF status ON orders
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE FUNCTION notify_order_status();
@@ -0,0 +1,20 @@
+-- =============================================================================
+-- Enforce non-negative stock in the database.
+--
+-- The stock tools already refuse to go below zero: their UPDATEs only match
+-- when the resulting quantity stays >= 0, which lets them report
+-- INSUFFICIENT_STOCK with the current quantity. This constraint makes the same
+-- invariant hold for any other writer (manual SQL, future tools). Fails if
+-- existing rows are already negative. Safe to run more than once.
+-- =============================================================================
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'stock_quantity_nonnegative'
+    ) THEN
+        ALTER TABLE stock
+            ADD CONSTRAINT stock_quantity_nonnegative CHECK (quantity >= 0);
+    END IF;
+END
+$$;
@@ -10,15 +10,24 @@ where it:
   3. Feeds the tool results back to the LLM.
   4. Repeats until the LLM produces a final text answer or the maximum
      number of rounds is reached.
+
+The loop is implemented as an event stream (ToolAgent.run_stream) so text
+tokens and tool activity can be forwarded to clients as they happen;
+ToolAgent.run consumes that stream and returns only the final result.
 """
 
-import json
+import asyncio
+import hashlib
 import logging
 import re
-from typing import Any, Callable, Dict, List, Tuple
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 
+import httpx
+import orjson
 from openai import AsyncOpenAI
 
+from llm_cache import CacheBackend, make_cache_key
+
 logger = logging.getLogger(__name__)
 
 # System prompt that sets the LLM's behavior and constraints
@@ -27,6 +36,111 @@ You MUST use the available tools to answer questions — never invent data.
 Be concise and respond in the same language the user writes in.
 """
 
+# Matches raw <function>...</function> tags the LLM sometimes hallucinates
+# in its text output. Compiled once since it runs on every final answer.
+_FUNCTION_TAG_RE = re.compile(r"<function>.*?</function>", re.DOTALL)
+
+
+def _parse_arguments(arguments: str) -> Dict[str, Any]:
+    """
+    Parse the JSON-encoded arguments of a tool call.
+
+    Args:
+        arguments: The raw JSON string sent by the LLM (may be empty).
+
+    Returns:
+        The decoded arguments, or an empty dict if they are missing or invalid.
+    """
+    try:
+        return orjson.loads(arguments) if arguments else {}
+    except Exception:
+        return {}
+
+
+def _is_tool_use_failed(error: Exception) -> bool:
+    """
+    Tell whether an API error is Groq's "tool_use_failed" error, raised
+    when the LLM produces a malformed tool call.
+
+    Args:
+        error: The exception raised by the OpenAI client.
+
+    Returns:
+        True for tool_use_failed errors, False for anything else.
+    """
+    return getattr(error, "code", None) == "tool_use_failed" or "tool_use_failed" in str(error)
+
+
+def to_openai_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Convert MCP tool definitions to the OpenAI function-calling format.
+
+    Args:
+        tools: List of tool definitions (name, description, input_schema).
+
+    Returns:
+        The same tools wrapped as OpenAI "function" tool entries.
+    """
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": t["name"],
+                "description": t["description"],
+                "parameters": t["input_schema"],
+            },
+        }
+        for t in tools
+    ]
+
+
+def _final_answer(content: Optional[str], trace: List[Dict[str, Any]]) -> str:
+    """
+    Clean up the LLM's final text before returning it to the user.
+
+    Args:
+        content: The raw message content produced by the LLM.
+        trace:   The tool trace collected so far.
+
+    Returns:
+        The text without hallucinated function tags, or the last tool
+        result if the LLM produced no text at all.
+    """
+    text = _FUNCTION_TAG_RE.sub("", content or "").strip()
+    if not text and trace:
+        text = trace[-1].get("tool_result", {}).get("result", "")
+    return text
+
+
+def _trim_history(messages: List[Any], window: int) -> List[Any]:
+    """
+    Apply a sliding window to the conversation history.
+
+    The system prompt and the original user message (the first two entries)
+    are always kept, followed by the last `window` messages. If the oldest
+    kept message is a tool result, the window is extended backwards until
+    the assistant message that requested it is included, since the API
+    rejects tool messages without their matching tool call.
+
+    Args:
+        messages: The full conversation history.
+        window:   Maximum number of messages to keep after the first two
+                  (0 or less disables trimming).
+
+    Returns:
+        The history to send to the LLM (the input list itself if nothing
+        had to be dropped).
+    """
+    head, rest = messages[:2], messages[2:]
+    if window <= 0 or len(rest) <= window:
+        return messages
+
+    start = len(rest) - window
+    while start > 0 and rest[start]["role"] == "tool":
+        start -= 1
+
+    return head + rest[start:]
+
 
 class ToolAgent:
     """
@@ -34,19 +148,129 @@ class ToolAgent:
     tools in a multi-round loop until a final answer is produced.
     """
 
-    def __init__(self, api_key: str, model: str):
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        cache: Optional[CacheBackend] = None,
+        history_window: int = 16,
+        max_concurrent_llm_calls: int = 8,
+    ):
         """
         Initialize the agent with Groq API credentials.
 
         Args:
-            api_key: API key for the Groq service.
-            model:   Name of the LLM model to use.
+            api_key:        API key for the Groq service.
+            model:          Name of the LLM model to use.
+            cache:          Optional backend used to reuse responses for
+                            identical requests. Caching is disabled when None.
+            history_window: Number of recent messages (besides the system
+                            prompt and user message) sent to the LLM on each
+                            round (default 16).
+            max_concurrent_llm_calls: Maximum number of Groq requests in
+                            flight at once across all chats (default 8).
+                            Extra requests wait instead of hitting rate limits.
         """
+        # One shared connection pool for all chats. HTTP/2 multiplexes
+        # concurrent completions over a single TLS connection to Groq.
+        http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=50,
+                keepalive_expiry=30.0,
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
         self.client = AsyncOpenAI(
             api_key=api_key,
             base_url="https://api.groq.com/openai/v1",
+            http_client=http_client,
         )
         self.model = model
+        self.cache = cache
+        self.history_window = history_window
+        self._llm_sem = asyncio.Semaphore(max_concurrent_llm_calls)
+
+    async def _stream_completion(self, **request: Any) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a chat-completion request, serving it from the cache if possible.
+
+        Text deltas are yielded as {"type": "token", "data": ...} events as
+        soon as they arrive. Once the response is complete, a single
+        {"type": "message", "message": ...} event carries the assembled
+        assistant message (content plus any tool calls).
+
+        Only deterministic requests (temperature unset or 0) are cached, since
+        sampled responses are not expected to repeat.
+
+        Args:
+            **request: Keyword arguments for chat.completions.create.
+
+        Yields:
+            Token events followed by the final message event.
+        """
+        cacheable = self.cache is not None and not request.get("temperature")
+        if cacheable:
+            key = make_cache_key(request)
+            cached = await self.cache.get(key)
+            if cached is not None:
+                logger.info("LLM cache hit")
+                if cached["content"]:
+                    yield {"type": "token", "data": cached["content"]}
+                yield {"type": "message", "message": cached}
+                return
+
+        content_parts: List[str] = []
+        # Tool calls arrive in fragments, keyed by their position in the list
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+
+        # Groq's stream is read into a queue by a separate task, so the
+        # semaphore slot is held only while Groq is sending, and a slow or
+        # disconnected /chat/stream client does not keep it taken
+        deltas: asyncio.Queue = asyncio.Queue()
+
+        async def pump() -> None:
+            try:
+                async with self._llm_sem:
+                    stream = await self.client.chat.completions.create(**request, stream=True)
+                    async for chunk in stream:
+                        if chunk.choices:
+                            deltas.put_nowait(chunk.choices[0].delta)
+            finally:
+                deltas.put_nowait(None)
+
+        reader = asyncio.create_task(pump())
+        try:
+            while (delta := await deltas.get()) is not None:
+                if delta.content:
+                    content_parts.append(delta.content)
+                    yield {"type": "token", "data": delta.content}
+
+                for tc in delta.tool_calls or []:
+                    entry = tool_calls.setdefault(
+                        tc.index,
+                        {"id": "", "type": "function", "function": {"name": "", "arguments": ""}},
+                    )
+                    if tc.id:
+                        entry["id"] = tc.id
+                    if tc.function and tc.function.name:
+                        entry["function"]["name"] += tc.function.name
+                    if tc.function and tc.function.arguments:
+                        entry["function"]["arguments"] += tc.function.arguments
+            # Re-raise a Groq error that ended the stream early
+            await reader
+        finally:
+            # The consumer went away mid-stream: stop reading from Groq
+            reader.cancel()
+
+        message: Dict[str, Any] = {"role": "assistant", "content": "".join(content_parts) or None}
+        if tool_calls:
+            message["tool_calls"] = [tool_calls[i] for i in sorted(tool_calls)]
+
+        if cacheable:
+            await self.cache.set(key, message)
+        yield {"type": "message", "message": message}
 
     async def run(
         self,
@@ -54,35 +278,68 @@ class ToolAgent:
         tools: List[Dict[str, Any]],
         tool_executor: Callable,
         max_rounds: int = 6,
+        openai_tools: Optional[List[Dict[str, Any]]] = None,
     ) -> Tuple[str, List[Dict[str, Any]]]:
         """
         Run the agent loop: send the user message to the LLM, execute any
         requested tools, and repeat until a final text answer is produced.
 
+        This consumes run_stream() and only returns once the answer is final.
+
         Args:
             user_message:  The user's input text.
             tools:         List of tool definitions (name, description, input_schema).
             tool_executor: Async callable that runs a tool by name and input dict,
                            returning a JSON string with the result.
             max_rounds:    Maximum number of LLM request rounds (default 6).
+            openai_tools:  Tools already converted with to_openai_tools. When
+                           omitted they are built from `tools` on every call.
 
         Returns:
             A tuple of (final_answer_text, trace) where trace is a list of
             dicts recording every tool call and result for debugging.
         """
+        answer = ""
+        trace: List[Dict[str, Any]] = []
+
+        async for event in self.run_stream(
+            user_message, tools, tool_executor, max_rounds, openai_tools
+        ):
+            if event["type"] == "tool_call":
+                trace.append({"tool_call": {"name": event["name"], "input": event["input"]}})
+            elif event["type"] == "tool_result":
+                trace.append({"tool_result": {"name": event["name"], "result": event["result"]}})
+            elif event["type"] == "final":
+                answer = event["answer"]
+
+        return answer, trace
+
+    async def run_stream(
+        self,
+        user_message: str,
+        tools: List[Dict[str, Any]],
+        tool_executor: Callable,
+        max_rounds: int = 6,
+        openai_tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the agent loop, yielding events as they happen.
+
+        Takes the same arguments as run(). The events are:
+          - {"type": "token", "data": str}: a piece of LLM output text.
+          - {"type": "tool_call", "name": str, "input": dict}: a tool is
+            about to be executed.
+          - {"type": "tool_result", "name": str, "result": str}: the JSON
+            result of a tool.
+          - {"type": "final", "answer": str}: the cleaned-up final answer.
+            Always the last event; token events may still contain raw text
+            (e.g. hallucinated function tags) that the final answer omits.
+        """
 
         # Convert tool definitions to the OpenAI function-calling format
-        openai_tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": t["name"],
-                    "description": t["description"],
-                    "parameters": t["input_schema"],
-                },
-            }
-            for t in tools
-        ]
+        # unless the caller already did it once up front
+        if openai_tools is None:
+            openai_tools = to_openai_tools(tools)
 
         # Build the initial conversation with system prompt and user message
         messages: List[Dict[str, Any]] = [
@@ -91,79 +348,115 @@ class ToolAgent:
         ]
         trace: List[Dict[str, Any]] = []  # Records all tool interactions
 
+        # Maps (tool name, hashed input) to the index in `messages` of the most
+        # recent result for that call, so older duplicates can be collapsed
+        seen: Dict[Tuple[str, str], int] = {}
+
         for round_num in range(max_rounds):
             logger.info(f"LLM round {round_num + 1}")
 
+            # Only send the most recent part of a long tool-call history
+            history = _trim_history(messages, self.history_window)
+            if len(history) < len(messages):
+                logger.debug(f"Trimmed {len(messages) - len(history)} messages from history")
+
+            msg: Dict[str, Any] = {}
             try:
-                resp = await self.client.chat.completions.create(
+                async for event in self._stream_completion(
                     model=self.model,
-                    messages=messages,
+                    messages=history,
                     tools=openai_tools,
                     tool_choice="auto",
                     max_tokens=1024,
-                    parallel_tool_calls=False,  # Execute one tool at a time
-                )
+                    parallel_tool_calls=True,  # Independent tools run concurrently
+                ):
+                    if event["type"] == "message":
+                        msg = event["message"]
+                    else:
+                        yield event
             except Exception as e:
-                # If Groq returns a tool_use_failed error, retry without tools
-                # so the LLM can still produce a text response
-                logger.warning(f"Tool call failed: {e}. Retrying without tools.")
-                resp = await self.client.chat.completions.create(
+                # Other errors (network, rate limits, ...) are not hidden
+                if not _is_tool_use_failed(e):
+                    raise
+                # If Groq returns a tool_use_failed error, retry with tool
+                # calls disabled so the LLM can still produce a text response.
+                # The tools stay in the request, which keeps it comparable
+                # with the main call for caching.
+                logger.warning(f"Tool call failed: {e}. Retrying with tool_choice=none.")
+                async for event in self._stream_completion(
                     model=self.model,
-                    messages=messages,
+                    messages=history,
+                    tools=openai_tools,
+                    tool_choice="none",
                     max_tokens=1024,
-                )
-                text = resp.choices[0].message.content or ""
-                # Remove any raw <function> XML tags the LLM may hallucinate
-                text = re.sub(r"<function>.*?</function>", "", text, flags=re.DOTALL).strip()
-                # If the LLM returned empty text, fall back to the last tool result
-                if not text.strip() and trace:
-                    last_result = trace[-1].get("tool_result", {}).get("result", "")
-                    text = last_result
-                return text, trace
-
-            msg = resp.choices[0].message
-            tool_calls = msg.tool_calls or []
+                ):
+                    if event["type"] == "message":
+                        msg = event["message"]
+                    else:
+                        yield event
+                # Strip hallucinated <function> tags, falling back to the
+                # last tool result if the LLM returned empty text
+                yield {"type": "final", "answer": _final_answer(msg.get("content"), trace)}
+                return
+
+            tool_calls = msg.get("tool_calls") or []
 
             # No tool calls means the LLM has produced its final answer
             if not tool_calls:
-                text = msg.content or ""
-                # Clean up any hallucinated function tags
-                text = re.sub(r"<function>.*?</function>", "", text, flags=re.DOTALL).strip()
-                # Fall back to last tool result if the answer is empty
-                if not text.strip() and trace:
-                    last_result = trace[-1].get("tool_result", {}).get("result", "")
-                    text = last_result
-                return text, trace
-
-            # The LLM wants to call one or more tools — execute each one
-            messages.append(msg)
+                yield {"type": "final", "answer": _final_answer(msg.get("content"), trace)}
+                return
 
-            for tc in tool_calls:
-                name = tc.function.name
-
-                # Parse the tool arguments from the JSON string
-                try:
-                    input_data = json.loads(tc.function.arguments) if tc.function.arguments else {}
-                except Exception:
-                    input_data = {}
+            # The LLM wants to call one or more tools — execute them concurrently
+            messages.append(msg)
 
+            calls = [
+                (tc, tc["function"]["name"], _parse_arguments(tc["function"]["arguments"]))
+                for tc in tool_calls
+            ]
+            for _, name, input_data in calls:
                 logger.info(f"Calling tool: {name} with {input_data}")
                 trace.append({"tool_call": {"name": name, "input": input_data}})
+                yield {"type": "tool_call", "name": name, "input": input_data}
 
-                # Execute the tool via the provided callback
-                try:
-                    result_str = await tool_executor(name, input_data)
-                except Exception as e:
-                    result_str = json.dumps({"ok": False, "error": str(e)})
+            # Execute every tool via the provided callback at the same time.
+            # return_exceptions keeps one failing tool from cancelling the others.
+            results = await asyncio.gather(
+                *(tool_executor(name, input_data) for _, name, input_data in calls),
+                return_exceptions=True,
+            )
+
+            # Record results in the original call order so each tool message
+            # stays paired with its tool_call_id
+            for (tc, name, input_data), result in zip(calls, results):
+                if isinstance(result, Exception):
+                    result_str = orjson.dumps({"ok": False, "error": str(result)}).decode()
+                else:
+                    result_str = result
 
                 trace.append({"tool_result": {"name": name, "result": result_str}})
+                yield {"type": "tool_result", "name": name, "result": result_str}
 
                 # Feed the tool result back to the LLM for the next round
                 messages.append({
                     "role": "tool",
-                    "tool_call_id": tc.id,
+                    "tool_call_id": tc["id"],
                     "content": result_str,
                 })
 
+                # If the same call was answered earlier, replace that older
+                # copy with a short pointer so the payload is only sent once
+                input_hash = hashlib.sha1(
+                    orjson.dumps(input_data, option=orjson.OPT_SORT_KEYS, default=str)
+                ).hexdigest()
+                key = (name, input_hash)
+                if key in seen:
+                    messages[seen[key]]["content"] = (
+                        f"[Previously returned: see later tool_call_id={tc['id']}]"
+                    )
+                seen[key] = len(messages) - 1
+
         # If we exhausted all rounds without a final answer, return an error message
-        return "Could not complete the task within the allowed tool-call rounds.", trace
\ No newline at end of file
+        yield {
+            "type": "final",
+            "answer": "Could not complete the task within the allowed tool-call rounds.",
+        }
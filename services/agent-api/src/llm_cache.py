@@ -0,0 +1,110 @@
+"""
+LLM response cache.
+
+Provides a small pluggable cache used by the ToolAgent to avoid re-sending
+identical chat-completion requests to Groq. Requests are identified by a
+SHA-256 hash of their serialized parameters (model, messages, tools, ...),
+so a cache hit only happens when the LLM would receive exactly the same
+input. The default backend is an in-process LRU with a time-to-live.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Protocol, Tuple
+
+
+class CacheBackend(Protocol):
+    """Interface every cache backend must implement."""
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        ...
+
+    async def set(self, key: str, value: Any) -> None:
+        """Store value under key."""
+        ...
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Return counters describing the cache usage."""
+        ...
+
+
+class LRUMemoryBackend:
+    """
+    In-process LRU cache whose entries expire after a fixed TTL.
+
+    The least recently used entry is evicted once maxsize is exceeded.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 3600.0):
+        """
+        Args:
+            maxsize: Maximum number of entries kept in memory.
+            ttl:     Seconds an entry stays valid after being stored.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Maps key -> (expires_at, value), ordered from oldest to newest use
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            # Expired entries are dropped lazily on access
+            del self._data[key]
+            self._misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self._hits += 1
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every cached entry (the hit/miss counters are kept)."""
+        self._data.clear()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+
+def _to_jsonable(obj: Any) -> Any:
+    """Convert SDK objects (e.g. assistant messages) into plain JSON data."""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return str(obj)
+
+
+def make_cache_key(request: Dict[str, Any]) -> str:
+    """
+    Build a deterministic cache key for a chat-completion request.
+
+    Args:
+        request: The keyword arguments passed to chat.completions.create.
+
+    Returns:
+        str: Hex-encoded SHA-256 of the canonical JSON form of the request.
+    """
+    payload = json.dumps(request, sort_keys=True, default=_to_jsonable)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -3,24 +3,34 @@ Entry point for the agent-api service.
 
 This FastAPI application acts as a bridge between end users and the
 MCP backend. On startup it connects to the MCP backend to discover
-available tools. When a user sends a chat message, the service:
-  1. Opens a new MCP client session.
+available tools and keeps that MCP client session open for the
+lifetime of the process, reopening it if the backend restarts or the
+session expires. When a user sends a chat message, the service:
+  1. Reuses the shared MCP client session.
   2. Passes the message and tool definitions to the ToolAgent (LLM).
   3. The LLM may call MCP tools and reason over the results.
   4. Returns the final answer along with a trace of tool calls.
+
+POST /chat/stream runs the same loop but streams tokens and tool activity
+to the client as Server-Sent Events.
 """
 
-import json
+import asyncio
 import logging
 from contextlib import asynccontextmanager
-from typing import Any, Dict, List
+from typing import Any, Awaitable, Callable, Dict, List
 
+import httpx
+import orjson
 from fastapi import FastAPI, HTTPException
+from fastmcp.exceptions import McpError, ToolError
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
 from settings import settings
 from mcp_client import make_client
-from llm import ToolAgent
+from llm import ToolAgent, to_openai_tools
+from llm_cache import LRUMemoryBackend
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,48 +39,223 @@ logger = logging.getLogger(__name__)
 # Stored as a module-level list so it's available to the /chat endpoint.
 _cached_tools: List[Dict[str, Any]] = []
 
+# Name prefixes of read-only tools whose results may be cached within a chat
+# when settings.CACHEABLE_TOOLS is not set explicitly.
+_CACHEABLE_PREFIXES = ("list_", "get_", "find_", "health")
+
+# MCP error codes that must not trigger a reconnect-and-retry: request
+# timeouts (408 in mcp 1.x, -32001 in later releases, where the backend's
+# auth middleware also uses -32001 for a refused token)
+_NO_RETRY_MCP_CODES = (408, -32001)
+
+# MCP error code the streamable-HTTP transport reports when the backend
+# answers 404 for an unknown session: the request was refused, never run
+_SESSION_TERMINATED_CODE = 32600
+
+# Serializes replacing the shared MCP client, so concurrent chats that hit
+# the same broken session reconnect only once
+_client_lock = asyncio.Lock()
+
+
+async def _open_client():
+    """
+    Create an MCP client and open its session.
+
+    Returns:
+        Client: The connected FastMCP client.
+    """
+    client = make_client(settings.MCP_URL, settings.MCP_API_KEY)
+    await client.__aenter__()
+    return client
+
+
+async def _close_client(client) -> None:
+    """Close an MCP client session, logging instead of raising on failure."""
+    try:
+        await client.__aexit__(None, None, None)
+    except Exception as e:
+        # A session whose backend went away often fails to close cleanly
+        logger.warning(f"Error while closing MCP session: {e!r}")
+
+
+async def _reconnect(stale):
+    """
+    Replace the shared MCP client with a freshly opened session.
+
+    Nothing is replaced if another request already swapped out the stale
+    client; the current one is returned instead.
+
+    Args:
+        stale: The client that failed (None if no client is open).
+
+    Returns:
+        Client: The client to use from now on.
+    """
+    async with _client_lock:
+        if app.state.mcp_client is stale:
+            app.state.mcp_client = None
+            if stale is not None:
+                await _close_client(stale)
+            logger.info("Opening a new MCP session...")
+            app.state.mcp_client = await _open_client()
+        return app.state.mcp_client
+
+
+def _is_session_error(exc: Exception) -> bool:
+    """
+    Tell whether a failed MCP call means the shared session is unusable
+    (backend restarted, session expired, connection dropped), so that a
+    reconnect is worthwhile. Whether the call itself may then be retried is
+    decided by _never_reached_backend and the read-only tool set.
+
+    Errors reported by the tool itself and timeouts are excluded: they do
+    not show that the session is broken.
+    """
+    if isinstance(exc, (ToolError, TimeoutError, httpx.TimeoutException)):
+        return False
+    if isinstance(exc, McpError):
+        # Older mcp releases keep the code on exc.error, newer ones on exc
+        code = getattr(getattr(exc, "error", exc), "code", None)
+        return code not in _NO_RETRY_MCP_CODES
+    # RuntimeError is what the client raises once its session is closed
+    return isinstance(exc, (httpx.TransportError, ConnectionError, RuntimeError))
+
+
+def _never_reached_backend(exc: Exception) -> bool:
+    """
+    Tell whether a failed MCP call provably never ran on the backend, so
+    that it is safe to retry even a write tool.
+
+    Only a refused connection or a terminated session (404 for an unknown
+    session id) qualify. A dropped response, a closed session or any other
+    error may arrive after the backend already ran the call.
+    """
+    if isinstance(exc, httpx.ConnectError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 404
+    if isinstance(exc, McpError):
+        code = getattr(getattr(exc, "error", exc), "code", None)
+        return code == _SESSION_TERMINATED_CODE
+    return False
+
+
+async def _load_tools(client) -> None:
+    """
+    Fetch the tool list from the MCP backend and refresh the caches.
+
+    The definitions are stored as-is in _cached_tools and pre-converted
+    to the OpenAI format on app.state.openai_tools, so the conversion is
+    not redone per request.
+
+    Args:
+        client: The connected MCP client to query.
+    """
+    global _cached_tools
+
+    # fastmcp has no JSON-RPC batch API, so list_tools and a ping are sent
+    # concurrently over the same session. The ping is only a warm-up check:
+    # its failure is logged, and only a list_tools failure is raised.
+    tools, alive = await asyncio.gather(
+        client.list_tools(), client.ping(), return_exceptions=True
+    )
+    if isinstance(tools, BaseException):
+        raise tools
+    if isinstance(alive, BaseException) or not alive:
+        reason = f": {alive!r}" if isinstance(alive, BaseException) else ""
+        logger.warning(f"MCP backend did not answer the ping{reason}")
+    cached = [
+        {
+            "name": t.name,
+            "description": t.description or f"Execute {t.name}",
+            # If the tool has no input parameters, provide an empty schema
+            "input_schema": (
+                t.inputSchema
+                if (t.inputSchema and t.inputSchema.get("properties"))
+                else {
+                    "type": "object",
+                    "properties": {},
+                    "required": [],
+                }
+            ),
+        }
+        for t in tools
+    ]
+    app.state.openai_tools = to_openai_tools(cached)
+    app.state.cacheable_tools = settings.CACHEABLE_TOOLS or {
+        t["name"] for t in cached if t["name"].startswith(_CACHEABLE_PREFIXES)
+    }
+    _cached_tools = cached
+    logger.info(f"Loaded {len(cached)} tools: {[t['name'] for t in cached]}")
+
+
+async def _ensure_tools() -> None:
+    """
+    Make sure an MCP session is open and the tool list is loaded, retrying
+    the discovery that failed at startup (or after a backend outage).
+
+    Raises:
+        HTTPException 503: If the MCP backend still cannot be reached.
+    """
+    if _cached_tools and app.state.mcp_client is not None:
+        return
+
+    try:
+        client = app.state.mcp_client or await _reconnect(None)
+        try:
+            await _load_tools(client)
+        except Exception as e:
+            if not _is_session_error(e):
+                raise
+            await _load_tools(await _reconnect(client))
+    except Exception as e:
+        logger.error(f"Failed to load tools from MCP: {e}")
+        raise HTTPException(status_code=503, detail="MCP tools not available")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Application lifespan handler — runs once at startup before the
-    server begins accepting requests.
+    server begins accepting requests, and again at shutdown.
 
-    Connects to the MCP backend, fetches the list of available tools,
-    and caches their definitions for later use by the chat endpoint.
+    Connects to the MCP backend, pings it, and fetches and caches the
+    available tools for later use by the chat endpoints. The client
+    session stays open (stored on app.state.mcp_client) so every chat
+    request reuses the same connection instead of paying a new handshake.
+    A failure here is only logged: the first chat request retries the
+    discovery. The session is closed when the application shuts down.
     """
-    global _cached_tools
+    app.state.mcp_client = None
+    app.state.openai_tools = []
+    app.state.cacheable_tools = set()
+
     logger.info("Connecting to MCP to fetch tools...")
     try:
-        client = make_client(settings.MCP_URL, settings.MCP_API_KEY)
-        async with client:
-            tools = await client.list_tools()
-            _cached_tools = [
-                {
-                    "name": t.name,
-                    "description": t.description or f"Execute {t.name}",
-                    # If the tool has no input parameters, provide an empty schema
-                    "input_schema": (
-                        t.inputSchema
-                        if (t.inputSchema and t.inputSchema.get("properties"))
-                        else {
-                            "type": "object",
-                            "properties": {},
-                            "required": [],
-                        }
-                    ),
-                }
-                for t in tools
-            ]
-        logger.info(f"Loaded {len(_cached_tools)} tools: {[t['name'] for t in _cached_tools]}")
+        app.state.mcp_client = await _open_client()
+        await _load_tools(app.state.mcp_client)
     except Exception as e:
         logger.error(f"Failed to load tools from MCP: {e}")
 
     yield  # Application runs while this generator is suspended
 
+    # Close the shared MCP session on shutdown
+    if app.state.mcp_client is not None:
+        await _close_client(app.state.mcp_client)
+
 
 app = FastAPI(title="agent-api", lifespan=lifespan)
-agent = ToolAgent(settings.GROQ_API_KEY, settings.GROQ_MODEL)
+agent = ToolAgent(
+    settings.GROQ_API_KEY,
+    settings.GROQ_MODEL,
+    # A cache size of 0 disables LLM response caching
+    cache=(
+        LRUMemoryBackend(maxsize=settings.LLM_CACHE_SIZE, ttl=settings.LLM_CACHE_TTL)
+        if settings.LLM_CACHE_SIZE > 0
+        else None
+    ),
+    max_concurrent_llm_calls=settings.GROQ_MAX_CONCURRENCY,
+)
 
 
 class ChatIn(BaseModel):
@@ -90,15 +275,128 @@ async def health():
     Simple health-check endpoint.
 
     Returns:
-        dict: Service status and the number of MCP tools loaded.
+        dict: Service status, the number of MCP tools loaded and the
+              LLM cache statistics (None when caching is disabled).
     """
     return {
         "ok": True,
         "service": "agent-api",
         "tools_loaded": len(_cached_tools),
+        "llm_cache": agent.cache.stats if agent.cache else None,
     }
 
 
+async def _check_chat_ready(payload: ChatIn) -> None:
+    """
+    Validate a chat request before running the agent, loading the MCP
+    tools first if they are not available yet.
+
+    Raises:
+        HTTPException 400: If the message is empty.
+        HTTPException 503: If no MCP tools are available.
+    """
+    if not payload.message.strip():
+        raise HTTPException(status_code=400, detail="message is empty")
+
+    await _ensure_tools()
+
+    if not _cached_tools:
+        raise HTTPException(status_code=503, detail="MCP tools not available")
+
+
+def _truncate_result(data: Any, result: str) -> str:
+    """
+    Cap the size of a serialized tool result before it is sent to the LLM.
+
+    Lists (e.g. query rows) are cut to the leading rows that fit and wrapped
+    as {"rows": [...], "_truncated": true, "_total": N}, which tells the LLM
+    how much was left out. Any other result is cut at the character limit
+    with an explicit marker.
+
+    Args:
+        data:   The decoded tool result.
+        result: The same result serialized as JSON.
+
+    Returns:
+        The result unchanged if it fits in settings.MAX_TOOL_RESULT_CHARS,
+        otherwise a truncated version.
+    """
+    cap = settings.MAX_TOOL_RESULT_CHARS
+    if cap <= 0 or len(result) <= cap:
+        return result
+
+    logger.warning(f"Tool result of {len(result)} chars exceeds {cap}; truncating")
+
+    if isinstance(data, list):
+        rows: List[Any] = []
+        size = 0
+        for row in data:
+            size += len(orjson.dumps(row)) + 1  # +1 for the separating comma
+            if size > cap:
+                break
+            rows.append(row)
+        return orjson.dumps({"rows": rows, "_truncated": True, "_total": len(data)}).decode()
+
+    return f"{result[:cap]}...[truncated {len(result) - cap} chars; refine query]"
+
+
+def _make_tool_executor() -> Callable[[str, Dict[str, Any]], Awaitable[str]]:
+    """
+    Build the tool executor used by the agent for a single chat.
+
+    Returns:
+        An async callable that runs an MCP tool by name and returns its
+        result as a JSON string.
+    """
+    async def execute_tool(name: str, input_data: Dict[str, Any]) -> str:
+        """Call a tool on the MCP backend and return its result as JSON."""
+        # Reuse the long-lived MCP session, read on every call so a session
+        # reopened by another chat is picked up. The session multiplexes
+        # requests by JSON-RPC id, so concurrent chats can share it.
+        client = app.state.mcp_client or await _reconnect(None)
+        try:
+            res = await client.call_tool(name, input_data or {})
+        except Exception as e:
+            if not _is_session_error(e):
+                raise
+            # The backend restarted or dropped the session: reopen it so later
+            # calls work. Only read-only tools, or calls that never reached
+            # the backend, are retried; a write may already have been applied.
+            client = await _reconnect(client)
+            if name not in app.state.cacheable_tools and not _never_reached_backend(e):
+                logger.warning(f"MCP session failed ({e!r}); reconnected, not retrying {name}")
+                raise
+            logger.warning(f"MCP session failed ({e!r}); reconnected to retry {name}")
+            res = await client.call_tool(name, input_data or {})
+        try:
+            # orjson never escapes non-ASCII characters
+            result = orjson.dumps(res.data).decode()
+        except Exception:
+            return _truncate_result(None, str(res))
+        return _truncate_result(res.data, result)
+
+    # Results of read-only tools are reused for repeated identical calls
+    # within this chat. Any other (write) tool invalidates them.
+    tool_cache = LRUMemoryBackend(maxsize=64, ttl=settings.TOOL_CACHE_TTL)
+
+    async def cached_executor(name: str, input_data: Dict[str, Any]) -> str:
+        """Serve read-only tool calls from the cache, executing them on a miss."""
+        if name not in app.state.cacheable_tools:
+            tool_cache.clear()
+            return await execute_tool(name, input_data)
+
+        key = f"{name}:{orjson.dumps(input_data or {}, option=orjson.OPT_SORT_KEYS).decode()}"
+        cached = await tool_cache.get(key)
+        if cached is not None:
+            return cached
+
+        result = await execute_tool(name, input_data)
+        await tool_cache.set(key, result)
+        return result
+
+    return cached_executor
+
+
 @app.post("/chat", response_model=ChatOut)
 async def chat(payload: ChatIn):
     """
@@ -109,34 +407,63 @@ async def chat(payload: ChatIn):
         payload: A ChatIn object containing the user's message.
 
     Returns:
-        ChatOut: The LLM's final answer and the full trace of tool calls.
+        A JSON response shaped like ChatOut: the LLM's final answer and the
+        full trace of tool calls.
 
     Raises:
         HTTPException 400: If the message is empty.
         HTTPException 503: If no MCP tools are available.
     """
-    if not payload.message.strip():
-        raise HTTPException(status_code=400, detail="message is empty")
+    await _check_chat_ready(payload)
 
-    if not _cached_tools:
-        raise HTTPException(status_code=503, detail="MCP tools not available")
+    answer, trace = await agent.run(
+        user_message=payload.message,
+        tools=_cached_tools,
+        tool_executor=_make_tool_executor(),
+        openai_tools=app.state.openai_tools,
+    )
 
-    # Open a fresh MCP client session for this request
-    client = make_client(settings.MCP_URL, settings.MCP_API_KEY)
+    # The trace is built by our own code, so it is serialized directly
+    # rather than validated field by field. Returning a Response makes
+    # FastAPI skip response_model validation, while response_model=ChatOut
+    # still documents the body in the OpenAPI schema.
+    return Response(
+        orjson.dumps({"answer": answer, "trace": trace}),
+        media_type="application/json",
+    )
 
-    async with client:
-        async def execute_tool(name: str, input_data: Dict[str, Any]) -> str:
-            """Call a tool on the MCP backend and return its result as JSON."""
-            res = await client.call_tool(name, input_data or {})
-            try:
-                return json.dumps(res.data, ensure_ascii=False)
-            except Exception:
-                return str(res)
-
-        answer, trace = await agent.run(
-            user_message=payload.message,
-            tools=_cached_tools,
-            tool_executor=execute_tool,
-        )
-
-    return ChatOut(answer=answer, trace=trace)
\ No newline at end of file
+
+@app.post("/chat/stream")
+async def chat_stream(payload: ChatIn):
+    """
+    Streaming variant of /chat using Server-Sent Events.
+
+    Each event is a JSON object sent as an SSE "data:" line: "token" events
+    carry pieces of LLM text, "tool_call" / "tool_result" events report
+    tool activity as it happens, and a last "final" event holds the
+    cleaned-up answer.
+
+    Args:
+        payload: A ChatIn object containing the user's message.
+
+    Returns:
+        StreamingResponse: A text/event-stream response.
+
+    Raises:
+        HTTPException 400: If the message is empty.
+        HTTPException 503: If no MCP tools are available.
+    """
+    await _check_chat_ready(payload)
+
+    events = agent.run_stream(
+        user_message=payload.message,
+        tools=_cached_tools,
+        tool_executor=_make_tool_executor(),
+        openai_tools=app.state.openai_tools,
+    )
+
+    async def sse():
+        async for event in events:
+            yield b"data: " + orjson.dumps(event) + b"\n\n"
+
+    return StreamingResponse(sse(), media_type="text/event-stream")
@@ -7,6 +7,8 @@ LLM provider and model to use, how to connect to the MCP backend,
 and which port the API listens on.
 """
 
+from typing import Set
+
 from pydantic_settings import BaseSettings
 
 
@@ -17,18 +19,35 @@ class Settings(BaseSettings):
     Attributes:
         GROQ_API_KEY: API key for authenticating with the Groq LLM service.
         GROQ_MODEL:   Name of the LLM model to use (default: llama-3.3-70b-versatile).
+        GROQ_MAX_CONCURRENCY: Maximum number of concurrent Groq requests (default: 8).
         MCP_URL:      URL of the MCP backend's HTTP endpoint.
         MCP_API_KEY:  API key sent to the MCP backend for authentication.
         PORT:         Port number the agent-api server listens on (default: 9000).
+        LLM_CACHE_SIZE: Maximum number of cached LLM responses (0 disables the cache).
+        LLM_CACHE_TTL:  Seconds a cached LLM response stays valid (default: 3600).
+        CACHEABLE_TOOLS: Read-only MCP tools whose results may be reused within
+                         a chat (default: derived from the tool name prefix).
+        TOOL_CACHE_TTL:  Seconds a cached tool result stays valid (default: 30).
+        MAX_TOOL_RESULT_CHARS: Size above which tool results are truncated
+                               before reaching the LLM (default: 8192, 0 disables).
     """
     GROQ_API_KEY: str
     GROQ_MODEL: str = "llama-3.3-70b-versatile"
+    GROQ_MAX_CONCURRENCY: int = 8
 
     MCP_URL: str = "http://mcp-backend:8000/mcp"
     MCP_API_KEY: str
 
     PORT: int = 9000
 
+    LLM_CACHE_SIZE: int = 512
+    LLM_CACHE_TTL: float = 3600.0
+
+    CACHEABLE_TOOLS: Set[str] = set()
+    TOOL_CACHE_TTL: float = 30.0
+
+    MAX_TOOL_RESULT_CHARS: int = 8192
+
     class Config:
         env_file = ".env"       # Load variables from a .env file if present
         extra = "ignore"        # Ignore extra env vars not listed above
@@ -1,4 +1,4 @@
-import secrets
+import hmac
 
 from mcp import McpError
 from mcp.types import ErrorData
@@ -11,19 +11,23 @@ from fastmcp.server.middleware import Middleware, MiddlewareContext
 class ApiKeyBearerAuthMiddleware(Middleware):
     def __init__(self, api_key: str):
         self.api_key = api_key
+        # Key bytes compared against the token, encoded once instead of per request
+        self._expected = api_key.encode()
 
     def _is_authorized(self) -> bool:
         headers = get_http_headers() or {}
-        auth = headers.get("authorization") or headers.get("Authorization")
-        if not auth:
-            return False
+        auth = headers.get("authorization")
+        if auth is None:
+            # Headers are normally lower-cased; fall back to a case-insensitive lookup
+            auth = next((v for k, v in headers.items() if k.lower() == "authorization"), "")
 
         prefix = "Bearer "
         if not auth.startswith(prefix):
             return False
 
-        token = auth[len(prefix) :].strip()
-        return bool(token) and secrets.compare_digest(token, self.api_key)
+        # Whitespace around the token is tolerated, as clients sometimes add it
+        token = auth[len(prefix) :].strip().encode()
+        return bool(token) and hmac.compare_digest(token, self._expected)
 
     async def __call__(self, context: MiddlewareContext, call_next):
         if not self.api_key:
@@ -21,6 +21,43 @@ DB_NAME = os.getenv("DB_NAME", "n8n")
 DB_USER = os.getenv("DB_USER", "n8n")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "hugo1234")
 
+# Directory holding the Postgres UNIX socket (e.g. /var/run/postgresql).
+# When set and DB_HOST points at this machine, connections go through the
+# socket instead of TCP. Empty by default (always use TCP).
+DB_SOCKET_DIR = os.getenv("DB_SOCKET_DIR", "").strip()
+
+# Connection URL of a read-only standby (e.g. postgresql://user:pw@host/db)
+# used by the pure-read tools. Standbys may lag the primary slightly. Empty
+# by default (reads use the primary pool).
+DB_REPLICA_URL = os.getenv("DB_REPLICA_URL", "").strip()
+
+# --- Connection pool sizing ---
+# Maximum connections kept open concurrently, and how many are opened up
+# front. The minimum defaults to the maximum so the whole pool is connected
+# at startup and the first burst of tool calls does not pay for new
+# connections.
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", str(DB_POOL_MAX)))
+
+# Seconds an idle connection stays open before asyncpg closes it. asyncpg
+# applies this to every connection, min_size ones included, so it defaults
+# to 0 (never close) when the whole pool is preallocated, and to 300 when
+# the pool is allowed to shrink.
+DB_POOL_IDLE_LIFETIME = float(
+    os.getenv("DB_POOL_IDLE_LIFETIME", "0" if DB_POOL_MIN >= DB_POOL_MAX else "300")
+)
+
+
+# --- Tool result caching ---
+# Seconds list_tables keeps a schema's table list before querying again
+# (0 disables the cache).
+LIST_TABLES_CACHE_TTL = float(os.getenv("LIST_TABLES_CACHE_TTL", "30"))
+
+
+# --- Ad-hoc query limits ---
+# Maximum run time of a query_readonly statement, in milliseconds.
+QUERY_READONLY_TIMEOUT_MS = int(os.getenv("QUERY_READONLY_TIMEOUT_MS", "5000"))
+
 
 # API key used by the authentication middleware in main.py.
 # If empty, authentication is effectively disabled.
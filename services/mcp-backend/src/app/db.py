@@ -1,20 +1,63 @@
 """
 Database connection pool module.
 
-Manages a single shared asyncpg connection pool for the mcp-backend service.
-Other modules call `get_pool()` to obtain the pool (creating it lazily on
-first use) and `close_pool()` to shut it down gracefully when the
-application exits.
+Manages the shared asyncpg connection pools for the mcp-backend service.
+Other modules call `get_pool()` to obtain the primary pool (creating it
+lazily on first use), `get_read_pool()` for queries that only read, and
+`close_pool()` to shut them down gracefully when the application exits.
 """
 
 import asyncpg
 from typing import Optional
-from app.config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+from app.config import (
+    DB_HOST,
+    DB_PORT,
+    DB_NAME,
+    DB_USER,
+    DB_PASSWORD,
+    DB_POOL_MIN,
+    DB_POOL_MAX,
+    DB_POOL_IDLE_LIFETIME,
+    DB_SOCKET_DIR,
+    DB_REPLICA_URL,
+)
+
+# Host names that refer to this machine, where a UNIX socket can be used
+_LOCAL_HOSTS = ("127.0.0.1", "localhost")
 
 # Module-level variable that holds the single shared connection pool.
 # It starts as None and is created on the first call to get_pool().
 _pool: Optional[asyncpg.Pool] = None
 
+# Pool on the read replica, only created when DB_REPLICA_URL is set
+_read_pool: Optional[asyncpg.Pool] = None
+
+
+async def _create_pool(**connect_kwargs) -> asyncpg.Pool:
+    """
+    Create a pool with the settings shared by the primary and replica pools.
+
+    Args:
+        **connect_kwargs: Connection target (host/port/... or dsn).
+
+    Returns:
+        asyncpg.Pool: The new connection pool.
+    """
+    # Sized from DB_POOL_MIN / DB_POOL_MAX. The min_size connections are
+    # opened immediately, and each connection keeps up to 1024 prepared
+    # statements for the tool queries, with no age limit since the tool SQL
+    # never changes. Connections idle for DB_POOL_IDLE_LIFETIME seconds are
+    # closed, whatever min_size is (0 keeps them open for good).
+    return await asyncpg.create_pool(
+        **connect_kwargs,
+        min_size=DB_POOL_MIN,
+        max_size=DB_POOL_MAX,
+        command_timeout=10,
+        statement_cache_size=1024,
+        max_cached_statement_lifetime=0,
+        max_inactive_connection_lifetime=DB_POOL_IDLE_LIFETIME,
+    )
+
 
 async def get_pool() -> asyncpg.Pool:
     """
@@ -27,26 +70,52 @@ async def get_pool() -> asyncpg.Pool:
     global _pool
 
     if _pool is None:
-        # Create a new pool with a minimum of 1 and maximum of 5 connections
-        _pool = await asyncpg.create_pool(
-            host=DB_HOST,
+        # A directory path as host makes asyncpg connect through the UNIX
+        # socket in it, skipping the TCP stack for every query
+        host = DB_SOCKET_DIR if DB_SOCKET_DIR and DB_HOST in _LOCAL_HOSTS else DB_HOST
+
+        _pool = await _create_pool(
+            host=host,
             port=DB_PORT,
             database=DB_NAME,
             user=DB_USER,
             password=DB_PASSWORD,
-            min_size=1,
-            max_size=5,
         )
 
     return _pool
 
 
+async def get_read_pool() -> asyncpg.Pool:
+    """
+    Return the pool for read-only queries.
+
+    This is a pool on the replica at DB_REPLICA_URL, created on first use,
+    so reads do not take connection slots from the writes on the primary.
+    Without a replica it is simply the primary pool.
+
+    Returns:
+        asyncpg.Pool: The pool to run read-only queries on.
+    """
+    global _read_pool
+
+    if not DB_REPLICA_URL:
+        return await get_pool()
+
+    if _read_pool is None:
+        _read_pool = await _create_pool(dsn=DB_REPLICA_URL)
+
+    return _read_pool
+
+
 async def close_pool() -> None:
     """
-    Close the shared connection pool and release all database connections.
-    Safe to call even if the pool was never created.
+    Close the shared connection pools and release all database connections.
+    Safe to call even if the pools were never created.
     """
-    global _pool
+    global _pool, _read_pool
+    if _read_pool is not None:
+        await _read_pool.close()
+        _read_pool = None
     if _pool is not None:
         await _pool.close()
         _pool = None
@@ -5,13 +5,39 @@ Creates and exports the single FastMCP application object used by the entire
 mcp-backend service. All MCP tools (health, products, stock, orders, etc.)
 register themselves on this instance via the @mcp.tool decorator.
 
+The server lifespan opens the database pools (primary and, if configured,
+read replica) at startup, so the first tool call does not pay the cost of
+establishing the connections, and closes them when the server shuts down.
+
 Note: Authentication is NOT handled here — it is managed at the HTTP layer
 by a Starlette middleware defined in main.py, combined with a Docker
 internal-network whitelist.
 """
 
+from contextlib import asynccontextmanager
+
 from fastmcp import FastMCP
 
+from app.db import close_pool, get_pool, get_read_pool
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """
+    Server lifespan handler — warms up the database pools before the
+    server starts accepting requests, and closes them on shutdown from
+    the same event loop that served the requests.
+    """
+    try:
+        # Inside the try, so a replica that fails to connect still gets
+        # the already opened primary pool closed
+        await get_pool()
+        await get_read_pool()
+        yield
+    finally:
+        await close_pool()
+
+
 # The shared FastMCP application instance.
 # Tool modules import this object and use @mcp.tool to register their functions.
-mcp = FastMCP("agent-lab-mcp-backend")
+mcp = FastMCP("agent-lab-mcp-backend", lifespan=lifespan)
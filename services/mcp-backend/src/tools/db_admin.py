@@ -7,9 +7,30 @@ Provides MCP tools for basic database inspection:
   - query_readonly: execute arbitrary read-only (SELECT) queries.
 """
 
-import re
+import time
+from typing import Final
+
 from app.mcp_app import mcp
 from app.db import get_pool
+from app.config import LIST_TABLES_CACHE_TTL, QUERY_READONLY_TIMEOUT_MS
+
+# Fixed queries of the inspection tools (query_readonly runs caller SQL).
+_SQL_PING: Final = "SELECT 1;"
+
+_SQL_LIST_TABLES: Final = """
+    SELECT array_agg(tablename ORDER BY tablename)
+    FROM pg_catalog.pg_tables
+    WHERE schemaname = $1;
+"""
+
+# Caps the run time of caller-supplied SQL; SET LOCAL only lasts until the
+# end of the surrounding transaction
+_SQL_READONLY_TIMEOUT: Final = f"SET LOCAL statement_timeout = {int(QUERY_READONLY_TIMEOUT_MS)};"
+
+# Table lists rarely change, so list_tables keeps them per schema as
+# schema -> (expires_at, tables) for LIST_TABLES_CACHE_TTL seconds. Only
+# schemas that hold tables are stored, which bounds it to the real schemas.
+_tables_cache: dict[str, tuple[float, list[str]]] = {}
 
 
 @mcp.tool
@@ -21,8 +42,8 @@ async def db_ping() -> dict:
         dict: {"ok": True} if the database responded correctly.
     """
     pool = await get_pool()
-    async with pool.acquire() as conn:
-        value = await conn.fetchval("SELECT 1;")
+    # Pool.fetchval acquires and releases the connection itself
+    value = await pool.fetchval(_SQL_PING)
     return {"ok": value == 1}
 
 
@@ -35,25 +56,130 @@ async def list_tables(schema: str = "public") -> list[str]:
         schema: The PostgreSQL schema to query (defaults to "public").
 
     Returns:
-        list[str]: Sorted list of table names.
+        list[str]: Sorted list of table names. May be up to
+                   LIST_TABLES_CACHE_TTL seconds old.
     """
+    cached = _tables_cache.get(schema)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
     pool = await get_pool()
-    async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            """
-            SELECT tablename
-            FROM pg_catalog.pg_tables
-            WHERE schemaname = $1
-            ORDER BY tablename;
-            """,
-            schema,
-        )
-    return [r["tablename"] for r in rows]
+    # Aggregate in Postgres so asyncpg decodes a single text[] value
+    # instead of building one Record per table
+    tables = await pool.fetchval(
+        _SQL_LIST_TABLES,
+        schema,
+    )
+    # array_agg returns NULL when the schema has no tables
+    if not tables:
+        # Not cached: callers may pass any schema name, and keeping every
+        # unknown one would make the cache grow without bound
+        return []
+    if LIST_TABLES_CACHE_TTL > 0:
+        _tables_cache[schema] = (time.monotonic() + LIST_TABLES_CACHE_TTL, tables)
+    return tables
+
+
+def _is_select(low: str) -> bool:
+    """
+    Tell whether a lowercased, left-stripped query starts with the
+    SELECT keyword (as a whole word, so "selection" does not count).
+    """
+    if not low.startswith("select"):
+        return False
+    return len(low) == 6 or not (low[6].isalnum() or low[6] == "_")
 
 
-# Regex that matches strings starting with a SELECT statement.
-# Used to reject any non-SELECT queries in query_readonly.
-_READONLY_SQL = re.compile(r"^\s*select\b", re.IGNORECASE)
+def _skip_token(sql: str, i: int) -> int:
+    """
+    Return the index just past the significant token starting at sql[i]:
+    a whole quoted literal or identifier, or else a single character.
+    """
+    n = len(sql)
+    c = sql[i]
+    # E'...' and $tag$ only open a literal at the start of a word
+    word_start = i == 0 or not (sql[i - 1].isalnum() or sql[i - 1] in "_$")
+
+    if c in ("'", '"'):
+        # A doubled quote inside the literal simply reads as the end of
+        # one literal and the start of the next
+        close = sql.find(c, i + 1)
+        return n if close == -1 else close + 1
+
+    if c in "eE" and word_start and sql.startswith("'", i + 1):
+        # Escape string: a backslash escapes the next character, quote included
+        j = i + 2
+        while j < n:
+            if sql[j] == "\\":
+                j += 2
+            elif sql[j] == "'":
+                if not sql.startswith("'", j + 1):
+                    return j + 1
+                j += 2
+            else:
+                j += 1
+        return n
+
+    if c == "$" and word_start:
+        # Dollar quote: $$ or $tag$, where the tag cannot start with a
+        # digit ($1 is a parameter)
+        j = i + 1
+        while j < n and (sql[j].isalnum() or sql[j] == "_"):
+            j += 1
+        if j < n and sql[j] == "$" and not sql[i + 1].isdigit():
+            delim = sql[i:j + 1]
+            close = sql.find(delim, j + 1)
+            return n if close == -1 else close + len(delim)
+
+    return i + 1
+
+
+def _strip_sql_tail(sql: str) -> str:
+    """
+    Cut a query after its last significant character, dropping trailing
+    semicolons, whitespace and comments, so it can be wrapped in a subquery.
+
+    Quoted strings and identifiers, E'...' strings with backslash escapes
+    and $tag$...$tag$ dollar-quoted strings are skipped over, so a ";" or
+    "--" inside them is kept.
+
+    Args:
+        sql: The query text as received.
+
+    Returns:
+        str: The query without its trailing semicolon(s) and comments.
+
+    Raises:
+        ValueError: If anything other than comments follows a semicolon,
+                    i.e. the text holds more than one statement.
+    """
+    end = 0  # index just past the last significant character
+    seen_semicolon = False
+    i, n = 0, len(sql)
+    while i < n:
+        c = sql[i]
+        if sql.startswith("--", i):
+            newline = sql.find("\n", i)
+            i = n if newline == -1 else newline + 1
+            continue
+        if sql.startswith("/*", i):
+            close = sql.find("*/", i + 2)
+            i = n if close == -1 else close + 2
+            continue
+        if c == ";":
+            seen_semicolon = True
+            i += 1
+            continue
+        if c.isspace():
+            i += 1
+            continue
+
+        if seen_semicolon:
+            raise ValueError("Only a single SELECT statement is allowed.")
+        i = _skip_token(sql, i)
+        end = i
+
+    return sql[:end]
 
 
 @mcp.tool
@@ -62,8 +188,10 @@ async def query_readonly(sql: str, limit: int = 100) -> list[dict]:
     Execute a read-only SQL query and return the results.
 
     Only SELECT statements are allowed; anything else raises a ValueError.
-    A LIMIT clause is appended automatically if the query does not already
-    include one, to prevent accidentally fetching huge result sets.
+    The query runs in a read-only transaction with a statement timeout
+    (QUERY_READONLY_TIMEOUT_MS). At most `limit` rows are returned, even
+    if the query has a LIMIT of its own, to prevent accidentally fetching
+    huge result sets.
 
     Args:
         sql: The SELECT query to run.
@@ -73,17 +201,30 @@ async def query_readonly(sql: str, limit: int = 100) -> list[dict]:
         list[dict]: Each row as a dictionary of column-name → value.
 
     Raises:
-        ValueError: If the query is not a SELECT statement.
+        ValueError: If the query is not a single SELECT statement.
     """
-    if not _READONLY_SQL.match(sql):
+    if not _is_select(sql.lstrip().lower()):
         raise ValueError("Only SELECT queries are allowed.")
 
-    # Append a LIMIT clause if the user didn't provide one
-    if re.search(r"\blimit\b", sql, re.IGNORECASE) is None:
-        sql = f"{sql.rstrip(';')} LIMIT {int(limit)};"
+    # Let Postgres apply the row cap by wrapping the query in a subquery.
+    # This holds even when the query has its own, larger LIMIT. Trailing
+    # semicolons and comments are cut first, as they cannot sit inside
+    # the parentheses.
+    inner = _strip_sql_tail(sql)
+    sql = f"SELECT * FROM (\n{inner}\n) AS _q LIMIT {int(limit)};"
 
     pool = await get_pool()
     async with pool.acquire() as conn:
-        rows = await conn.fetch(sql)
-
-    return [dict(r) for r in rows]
+        # A read-only transaction makes Postgres reject any write the SQL
+        # might still smuggle in, and the timeout stops runaway queries
+        async with conn.transaction(readonly=True):
+            await conn.execute(_SQL_READONLY_TIMEOUT)
+            rows = await conn.fetch(sql)
+
+    if not rows:
+        return []
+
+    # Every row has the same columns, so read the names once and zip them
+    # with each row's values instead of letting dict() rebuild the mapping
+    cols = list(rows[0].keys())
+    return [dict(zip(cols, r)) for r in rows]
@@ -3,10 +3,21 @@ Health-check tool for the MCP backend.
 
 Exposes a simple tool that returns an "ok" status, which can be used by
 monitoring systems or other services to verify the mcp-backend is running.
+The same payload is also served as plain JSON on GET /health for liveness
+probes that do not speak MCP.
 """
 
+import orjson
+from starlette.requests import Request
+from starlette.responses import Response
+
 from app.mcp_app import mcp
 
+# The health payload never changes, so the dict and its JSON encoding are
+# built once at import instead of on every call.
+_HEALTH_DICT = {"ok": True, "service": "agent-lab-mcp-backend"}
+_HEALTH_BYTES = orjson.dumps(_HEALTH_DICT)
+
 
 @mcp.tool
 def health() -> dict:
@@ -16,4 +27,15 @@ def health() -> dict:
     Returns:
         dict: A dictionary with "ok" set to True and the service name.
     """
-    return {"ok": True, "service": "agent-lab-mcp-backend"}
+    return _HEALTH_DICT
+
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health_route(request: Request) -> Response:
+    """
+    Plain HTTP liveness endpoint that bypasses the MCP tool envelope.
+
+    Returns:
+        Response: The pre-serialized health payload.
+    """
+    return Response(content=_HEALTH_BYTES, media_type="application/json")
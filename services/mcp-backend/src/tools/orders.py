@@ -5,35 +5,223 @@ Provides MCP tools for the full order lifecycle:
   - create_order:       create a new order in PENDING state.
   - get_order:          retrieve an order with its items and reservations.
   - reserve_for_order:  reserve stock for the order and mark it RESERVED.
-  - release_stock:      release a reservation and cancel the order.
+  - release_stock:      release reserved stock and cancel the order.
   - mark_paid:          mark an order as PAID.
-  - mark_failed:        mark an order as FAILED.
+  - mark_failed:        mark an order as FAILED, releasing its reserved stock.
 
 All write operations use database transactions to keep data consistent.
+
+Order and reservation IDs are passed to Postgres without ::uuid casts and
+read back without ::text casts; asyncpg's built-in uuid codec sends and
+receives them in binary form (16 bytes instead of 36 characters).
 """
 
+import uuid
+from typing import Final
+
+import orjson
+
 from app.mcp_app import mcp
-from app.db import get_pool
+from app.db import get_pool, get_read_pool
+
+# SQL statements used by the tools below. Kept as module-level constants so
+# each query text is built once and always hits the same entry in asyncpg's
+# per-connection prepared-statement cache.
+_SQL_CREATE_ORDER: Final = """
+    WITH o AS (
+        INSERT INTO orders (status)
+        VALUES ('PENDING')
+        RETURNING id, status
+    ), i AS (
+        INSERT INTO order_items (order_id, sku, product_id, qty)
+        SELECT o.id, t.sku, p.id, t.qty
+        FROM o
+        CROSS JOIN UNNEST($1::text[], $2::int[]) AS t(sku, qty)
+        LEFT JOIN products p ON p.sku = t.sku
+    )
+    SELECT id, status FROM o;
+"""
+
+_SQL_GET_ORDER: Final = """
+    SELECT json_build_object(
+        'order_id', o.id,
+        'status', o.status,
+        'items', COALESCE(
+            (SELECT json_agg(json_build_object('sku', i.sku, 'qty', i.qty) ORDER BY i.id)
+             FROM order_items i
+             WHERE i.order_id = o.id),
+            '[]'::json
+        ),
+        'reservations', COALESCE(
+            (SELECT json_agg(json_build_object(
+                        'id', r.id,
+                        'sku', r.sku,
+                        'qty', r.qty,
+                        'active', r.active,
+                        'created_at', r.created_at,
+                        'released_at', r.released_at
+                    ) ORDER BY r.created_at)
+             FROM reservations r
+             WHERE r.order_id = o.id),
+            '[]'::json
+        )
+    )
+    FROM orders o
+    WHERE o.id = $1;
+"""
 
+_SQL_RESERVE_FOR_ORDER: Final = """
+    WITH o AS (
+        SELECT id, status
+        FROM orders
+        WHERE id = $1
+        FOR UPDATE
+    ), item AS (
+        SELECT
+            i.sku,
+            i.qty,
+            COALESCE(
+                i.product_id,
+                (SELECT p.id FROM products p WHERE p.sku = i.sku)
+            ) AS product_id
+        FROM order_items i, o
+        WHERE i.order_id = o.id
+        AND o.status NOT IN ('PAID', 'CANCELLED', 'FAILED')
+        ORDER BY i.id
+        LIMIT 1
+    ), prod AS (
+        SELECT item.product_id AS id, item.sku, item.qty
+        FROM item
+        WHERE item.product_id IS NOT NULL
+    ), upd AS (
+        UPDATE stock s
+        SET quantity = s.quantity - prod.qty, updated_at = now()
+        FROM prod
+        WHERE s.product_id = prod.id
+        AND s.quantity >= prod.qty
+        RETURNING s.product_id
+    ), mv AS (
+        INSERT INTO stock_movements (product_id, delta, reason, order_id)
+        SELECT prod.id, -prod.qty, 'reserve', o.id
+        FROM prod, upd, o
+    ), res AS (
+        INSERT INTO reservations (order_id, sku, product_id, qty, active)
+        SELECT o.id, prod.sku, prod.id, prod.qty, TRUE
+        FROM prod, upd, o
+        RETURNING id, sku, qty, active, created_at, released_at
+    ), ord AS (
+        UPDATE orders
+        SET status = 'RESERVED', updated_at = now()
+        FROM upd
+        WHERE orders.id = $1
+    )
+    SELECT
+        o.status,
+        item.sku AS item_sku,
+        item.qty AS item_qty,
+        prod.id AS product_id,
+        (SELECT quantity FROM stock WHERE product_id = prod.id) AS current_qty,
+        res.id, res.sku, res.qty, res.active, res.created_at, res.released_at
+    FROM (SELECT 1) AS one
+    LEFT JOIN o ON TRUE
+    LEFT JOIN item ON TRUE
+    LEFT JOIN prod ON TRUE
+    LEFT JOIN res ON TRUE;
+"""
+
+_SQL_RELEASE_STOCK: Final = """
+    WITH o AS (
+        SELECT id
+        FROM orders
+        WHERE id = $1
+        FOR UPDATE
+    ), r AS (
+        UPDATE reservations res
+        SET active = FALSE, released_at = now()
+        FROM o
+        WHERE res.order_id = o.id
+        AND res.active = TRUE
+        RETURNING res.product_id, res.qty
+    ), per_product AS (
+        SELECT r.product_id, SUM(r.qty)::int AS qty
+        FROM r
+        GROUP BY r.product_id
+    ), s AS (
+        UPDATE stock st
+        SET quantity = st.quantity + pp.qty, updated_at = now()
+        FROM per_product pp
+        WHERE st.product_id = pp.product_id
+    ), m AS (
+        INSERT INTO stock_movements (product_id, delta, reason, order_id)
+        SELECT pp.product_id, pp.qty, 'release', o.id
+        FROM per_product pp, o
+    ), cancel AS (
+        UPDATE orders
+        SET status = 'CANCELLED', updated_at = now()
+        FROM o
+        WHERE orders.id = o.id
+        AND EXISTS (SELECT 1 FROM r)
+    )
+    SELECT count(*) FROM r;
+"""
 
-def _normalize_order_id(order_id: str) -> str:
+_SQL_SET_ORDER_PAID: Final = """
+    UPDATE orders
+    SET status = 'PAID', updated_at = now()
+    WHERE id = $1
+    AND status NOT IN ('PAID', 'CANCELLED', 'FAILED')
+    RETURNING status;
+"""
+
+_SQL_MARK_FAILED: Final = """
+    WITH o AS (
+        UPDATE orders
+        SET status = 'FAILED', updated_at = now()
+        WHERE id = $1
+        AND status NOT IN ('PAID', 'CANCELLED', 'FAILED')
+        RETURNING id, status
+    ), r AS (
+        UPDATE reservations res
+        SET active = FALSE, released_at = now()
+        FROM o
+        WHERE res.order_id = o.id
+        AND res.active = TRUE
+        RETURNING res.product_id, res.qty
+    ), per_product AS (
+        SELECT r.product_id, SUM(r.qty)::int AS qty
+        FROM r
+        GROUP BY r.product_id
+    ), s AS (
+        UPDATE stock st
+        SET quantity = st.quantity + pp.qty, updated_at = now()
+        FROM per_product pp
+        WHERE st.product_id = pp.product_id
+    ), m AS (
+        INSERT INTO stock_movements (product_id, delta, reason, order_id)
+        SELECT pp.product_id, pp.qty, 'release', o.id
+        FROM per_product pp, o
+    )
+    SELECT (SELECT status FROM o) AS status, (SELECT count(*) FROM r) AS released;
+"""
+
+
+def _normalize_order_id(order_id: str) -> uuid.UUID:
     """
-    Validate and clean up the incoming order_id string.
+    Validate and parse the incoming order_id string.
 
     Args:
         order_id: Raw order ID from the caller.
 
     Returns:
-        str: Trimmed order ID.
+        uuid.UUID: The parsed order ID, passed to asyncpg as-is.
 
     Raises:
-        ValueError: If the order_id is too short to be a valid UUID.
+        ValueError: If the order_id is not a valid UUID.
     """
-    oid = order_id.strip()
-    # UUIDs are 36 characters; anything much shorter is likely invalid
-    if len(oid) < 30:
-        raise ValueError("order_id looks invalid")
-    return oid
+    try:
+        return uuid.UUID(order_id.strip())
+    except ValueError:
+        raise ValueError("order_id looks invalid") from None
 
 
 @mcp.tool
@@ -56,31 +244,15 @@ async def create_order(sku: str, qty: int) -> dict:
 
     pool = await get_pool()
 
+    # The header and its items are inserted by one statement. Items are
+    # passed as parallel SKU / quantity arrays, so orders with several
+    # items would still take a single round trip.
     async with pool.acquire() as conn:
-        async with conn.transaction():
-            # Create the order header with PENDING status
-            order = await conn.fetchrow(
-                """
-                INSERT INTO orders (status)
-                VALUES ('PENDING')
-                RETURNING id::text AS id, status, created_at, updated_at;
-                """
-            )
-
-            # Add the single line item to the order
-            await conn.execute(
-                """
-                INSERT INTO order_items (order_id, sku, qty)
-                VALUES ($1::uuid, $2, $3);
-                """,
-                order["id"],
-                sku,
-                qty,
-            )
+        order = await conn.fetchrow(_SQL_CREATE_ORDER, [sku], [qty])
 
     return {
         "ok": True,
-        "order_id": order["id"],
+        "order_id": str(order["id"]),
         "status": order["status"],
         "sku": sku,
         "qty": qty,
@@ -101,48 +273,18 @@ async def get_order(order_id: str) -> dict:
     """
     oid = _normalize_order_id(order_id)
 
-    pool = await get_pool()
-
-    async with pool.acquire() as conn:
-        order = await conn.fetchrow(
-            """
-            SELECT id::text AS id, status, created_at, updated_at
-            FROM orders
-            WHERE id = $1::uuid;
-            """,
-            oid,
-        )
+    pool = await get_read_pool()
 
-        if not order:
-            return {"ok": False, "error": "ORDER_NOT_FOUND", "order_id": oid}
-
-        # Fetch all line items for this order
-        items = await conn.fetch(
-            """
-            SELECT sku, qty
-            FROM order_items
-            WHERE order_id = $1::uuid;
-            """,
-            oid,
-        )
+    # The order, its items and its reservations are assembled into one JSON
+    # document by Postgres, so this is a single round trip on a connection
+    # borrowed from the pool only for that query
+    doc = await pool.fetchval(_SQL_GET_ORDER, oid)
 
-        # Fetch all stock reservations (active or released) for this order
-        reservations = await conn.fetch(
-            """
-            SELECT id::text AS id, sku, qty, active, created_at, released_at
-            FROM reservations
-            WHERE order_id = $1::uuid;
-            """,
-            oid,
-        )
+    if doc is None:
+        return {"ok": False, "error": "ORDER_NOT_FOUND", "order_id": oid}
 
-    return {
-        "ok": True,
-        "order_id": order["id"],
-        "status": order["status"],
-        "items": [dict(r) for r in items],
-        "reservations": [dict(r) for r in reservations],
-    }
+    # orjson decodes the whole document in one C-level pass
+    return {"ok": True, **orjson.loads(doc)}
 
 
 @mcp.tool
@@ -150,9 +292,10 @@ async def reserve_for_order(order_id: str) -> dict:
     """
     Reserve stock for an order and transition it to RESERVED status.
 
-    This locks the stock row, subtracts the required quantity, records a
-    stock movement, creates a reservation record, and updates the order
-    status — all inside a single transaction.
+    A single statement locks the order, subtracts the required quantity
+    from stock (only if enough is available), records a stock movement,
+    creates a reservation record, and updates the order status. The
+    extra columns it returns explain why nothing was reserved.
 
     Args:
         order_id: The UUID of the order to reserve stock for.
@@ -165,139 +308,57 @@ async def reserve_for_order(order_id: str) -> dict:
 
     pool = await get_pool()
 
+    # The item carries the product_id resolved by create_order; the SKU is
+    # only looked up again for items whose product did not exist back then
     async with pool.acquire() as conn:
-        async with conn.transaction():
-            # Lock the order row to prevent concurrent reservation attempts
-            order = await conn.fetchrow(
-                """
-                SELECT status
-                FROM orders
-                WHERE id = $1::uuid
-                FOR UPDATE;
-                """,
-                oid,
-            )
-
-            if not order:
-                return {"ok": False, "error": "ORDER_NOT_FOUND"}
-
-            # Only PENDING or RESERVED orders can be reserved
-            if order["status"] in ("PAID", "CANCELLED", "FAILED"):
-                return {
-                    "ok": False,
-                    "error": "ORDER_NOT_RESERVABLE",
-                    "status": order["status"],
-                }
-
-            # Get the first (and currently only) item in the order
-            item = await conn.fetchrow(
-                """
-                SELECT sku, qty
-                FROM order_items
-                WHERE order_id = $1::uuid
-                LIMIT 1;
-                """,
-                oid,
-            )
-
-            if not item:
-                return {"ok": False, "error": "ORDER_HAS_NO_ITEMS"}
-
-            sku = item["sku"]
-            qty = int(item["qty"])
-
-            # Look up the product to get its internal ID
-            prod = await conn.fetchrow(
-                "SELECT id FROM products WHERE sku = $1;",
-                sku,
-            )
-
-            if not prod:
-                return {"ok": False, "error": "SKU_NOT_FOUND", "sku": sku}
-
-            # Lock the stock row to prevent race conditions
-            stock_row = await conn.fetchrow(
-                """
-                SELECT quantity
-                FROM stock
-                WHERE product_id = $1
-                FOR UPDATE;
-                """,
-                prod["id"],
-            )
-
-            current_qty = stock_row["quantity"] if stock_row else 0
-
-            # Check there is enough stock to fulfill the order
-            if current_qty < qty:
-                return {
-                    "ok": False,
-                    "error": "INSUFFICIENT_STOCK",
-                    "current_qty": current_qty,
-                    "requested_qty": qty,
-                }
-
-            new_qty = current_qty - qty
-
-            # Subtract the reserved quantity from stock
-            await conn.execute(
-                """
-                UPDATE stock
-                SET quantity = $2, updated_at = now()
-                WHERE product_id = $1;
-                """,
-                prod["id"],
-                new_qty,
-            )
-
-            # Log the stock movement with a negative delta (stock removed)
-            await conn.execute(
-                """
-                INSERT INTO stock_movements (product_id, delta, reason)
-                VALUES ($1, $2, $3);
-                """,
-                prod["id"],
-                -qty,
-                f"reserve_order:{oid}",
-            )
-
-            # Create the reservation record
-            reservation = await conn.fetchrow(
-                """
-                INSERT INTO reservations (order_id, sku, qty, active)
-                VALUES ($1::uuid, $2, $3, TRUE)
-                RETURNING id::text AS id, sku, qty, active, created_at, released_at;
-                """,
-                oid,
-                sku,
-                qty,
-            )
-
-            # Move the order to RESERVED status
-            await conn.execute(
-                """
-                UPDATE orders
-                SET status = 'RESERVED', updated_at = now()
-                WHERE id = $1::uuid;
-                """,
-                oid,
-            )
-
+        row = await conn.fetchrow(_SQL_RESERVE_FOR_ORDER, oid)
+
+    if row["status"] is None:
+        return {"ok": False, "error": "ORDER_NOT_FOUND"}
+
+    # Only PENDING or RESERVED orders can be reserved
+    if row["status"] in ("PAID", "CANCELLED", "FAILED"):
+        return {
+            "ok": False,
+            "error": "ORDER_NOT_RESERVABLE",
+            "status": row["status"],
+        }
+
+    if row["item_sku"] is None:
+        return {"ok": False, "error": "ORDER_HAS_NO_ITEMS"}
+
+    if row["product_id"] is None:
+        return {"ok": False, "error": "SKU_NOT_FOUND", "sku": row["item_sku"]}
+
+    # No reservation was inserted: the stock UPDATE found too little stock
+    if row["id"] is None:
+        return {
+            "ok": False,
+            "error": "INSUFFICIENT_STOCK",
+            "current_qty": row["current_qty"] or 0,
+            "requested_qty": row["item_qty"],
+        }
+
+    reservation = {
+        key: row[key] for key in ("id", "sku", "qty", "active", "created_at", "released_at")
+    }
     return {
         "ok": True,
         "order_id": oid,
         "status": "RESERVED",
-        "reservation": dict(reservation),
+        "reservation": reservation,
     }
 
 
 @mcp.tool
 async def release_stock(order_id: str) -> dict:
     """
-    Release an active stock reservation and cancel the order.
+    Release the active stock reservations of an order and cancel it.
 
-    The reserved quantity is added back to the stock, the reservation is
-    marked inactive, and the order status is set to CANCELLED.
+    The reserved quantity is added back to the stock (and logged as a
+    stock movement), the reservations are marked inactive, and the order
+    status is set to CANCELLED — all in one statement. Nothing changes
+    if the order has no active reservation.
 
     Args:
         order_id: The UUID of the order whose reservation should be released.
@@ -310,76 +371,13 @@ async def release_stock(order_id: str) -> dict:
 
     pool = await get_pool()
 
-    async with pool.acquire() as conn:
-        async with conn.transaction():
-            # Find and lock the active reservation for this order
-            reservation = await conn.fetchrow(
-                """
-                SELECT id::text AS id, sku, qty
-                FROM reservations
-                WHERE order_id = $1::uuid
-                AND active = TRUE
-                FOR UPDATE;
-                """,
-                oid,
-            )
-
-            # If no active reservation exists, nothing to release
-            if not reservation:
-                return {"ok": True, "released": False}
-
-            sku = reservation["sku"]
-            qty = reservation["qty"]
-
-            prod = await conn.fetchrow(
-                "SELECT id FROM products WHERE sku = $1;",
-                sku,
-            )
-
-            # Lock the stock row for update
-            stock_row = await conn.fetchrow(
-                """
-                SELECT quantity
-                FROM stock
-                WHERE product_id = $1
-                FOR UPDATE;
-                """,
-                prod["id"],
-            )
-
-            current_qty = stock_row["quantity"] if stock_row else 0
-            new_qty = current_qty + qty  # Add the reserved quantity back
-
-            # Restore the stock quantity
-            await conn.execute(
-                """
-                UPDATE stock
-                SET quantity = $2, updated_at = now()
-                WHERE product_id = $1;
-                """,
-                prod["id"],
-                new_qty,
-            )
-
-            # Mark the reservation as inactive
-            await conn.execute(
-                """
-                UPDATE reservations
-                SET active = FALSE, released_at = now()
-                WHERE id = $1::uuid;
-                """,
-                reservation["id"],
-            )
-
-            # Cancel the order
-            await conn.execute(
-                """
-                UPDATE orders
-                SET status = 'CANCELLED', updated_at = now()
-                WHERE id = $1::uuid;
-                """,
-                oid,
-            )
+    # The order row is locked first, in the same order reserve_for_order
+    # and mark_failed take their locks, so the three cannot deadlock
+    released = await pool.fetchval(_SQL_RELEASE_STOCK, oid)
+
+    # If no active reservation exists, nothing was released
+    if not released:
+        return {"ok": True, "released": False}
 
     return {
         "ok": True,
@@ -394,52 +392,65 @@ async def mark_paid(order_id: str) -> dict:
     """
     Mark an order as PAID.
 
+    Orders that are unknown or already PAID, CANCELLED or FAILED are left
+    untouched.
+
     Args:
         order_id: The UUID of the order to mark as paid.
 
     Returns:
-        dict: Confirmation with the order ID and new status.
+        dict: The order ID and new status, with "ok" False and status
+              "UNCHANGED" when the order could not be transitioned.
     """
     oid = _normalize_order_id(order_id)
 
     pool = await get_pool()
 
-    async with pool.acquire() as conn:
-        await conn.execute(
-            """
-            UPDATE orders
-            SET status = 'PAID', updated_at = now()
-            WHERE id = $1::uuid;
-            """,
-            oid,
-        )
+    # The status guard lives in the WHERE clause, so RETURNING yields a row
+    # only when the transition really happened. Pool.fetchval acquires
+    # and releases the connection around this single statement.
+    status = await pool.fetchval(
+        _SQL_SET_ORDER_PAID,
+        oid,
+    )
 
-    return {"ok": True, "order_id": oid, "status": "PAID"}
+    return {"ok": status is not None, "order_id": oid, "status": status or "UNCHANGED"}
 
 
 @mcp.tool
 async def mark_failed(order_id: str) -> dict:
     """
-    Mark an order as FAILED.
+    Mark an order as FAILED and release any stock reserved for it.
+
+    The status change, the release of the active reservations, the stock
+    restock and the stock-movement entries are all done by one statement,
+    so they happen atomically in a single round trip. Orders that are
+    unknown or already PAID, CANCELLED or FAILED are left untouched.
 
     Args:
         order_id: The UUID of the order to mark as failed.
 
     Returns:
-        dict: Confirmation with the order ID and new status.
+        dict: The order ID, new status ("UNCHANGED" with "ok" False when
+              the order could not be transitioned), and whether reserved
+              stock was released.
     """
     oid = _normalize_order_id(order_id)
 
     pool = await get_pool()
 
-    async with pool.acquire() as conn:
-        await conn.execute(
-            """
-            UPDATE orders
-            SET status = 'FAILED', updated_at = now()
-            WHERE id = $1::uuid;
-            """,
-            oid,
-        )
+    # Updating the order first locks its row, so a concurrent
+    # reserve_for_order / release_stock waits for this statement.
+    # Reservations are summed per product so several reservations for
+    # the same SKU all go back into stock.
+    status, released = await pool.fetchrow(
+        _SQL_MARK_FAILED,
+        oid,
+    )
 
-    return {"ok": True, "order_id": oid, "status": "FAILED"}
+    return {
+        "ok": status is not None,
+        "order_id": oid,
+        "status": status or "UNCHANGED",
+        "released": released > 0,
+    }
@@ -2,14 +2,37 @@
 Product management tool.
 
 Exposes an MCP tool to create (or update) a product in the database,
-optionally setting an initial stock quantity. The operation is wrapped
-in a database transaction so that the product, stock record, and
-stock-movement log entry are all created atomically.
+optionally setting an initial stock quantity. The product, stock record,
+and stock-movement log entry are written by a single SQL statement, so
+they are all created atomically.
 """
 
+from typing import Final
+
 from app.mcp_app import mcp
 from app.db import get_pool
 
+# Single-statement product upsert used by create_product (see below).
+_SQL_CREATE_PRODUCT: Final = """
+    WITH p AS (
+        INSERT INTO products (sku, name)
+        VALUES ($1, $2)
+        ON CONFLICT (sku) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id, sku, name
+    ), s AS (
+        INSERT INTO stock (product_id, quantity)
+        SELECT id, $3::int FROM p
+        ON CONFLICT (product_id) DO UPDATE SET
+          quantity = GREATEST(stock.quantity, EXCLUDED.quantity),
+          updated_at = now()
+    ), m AS (
+        INSERT INTO stock_movements (product_id, delta, reason)
+        SELECT id, $3::int, 'initial' FROM p
+        WHERE $3::int > 0
+    )
+    SELECT id, sku, name FROM p;
+"""
+
 
 @mcp.tool
 async def create_product(sku: str, name: str, initial_qty: int = 0) -> dict:
@@ -37,44 +60,16 @@ async def create_product(sku: str, name: str, initial_qty: int = 0) -> dict:
 
     pool = await get_pool()
 
+    # Upsert the product, make sure it has a stock row (keeping the higher
+    # quantity if one exists) and log the initial stock as a movement when
+    # there is stock to add. Written as one statement with data-modifying
+    # CTEs so it takes a single round trip and is atomic on its own.
     async with pool.acquire() as conn:
-        async with conn.transaction():
-            # Insert the product or update its name if the SKU already exists
-            row = await conn.fetchrow(
-                """
-                INSERT INTO products (sku, name)
-                VALUES ($1, $2)
-                ON CONFLICT (sku) DO UPDATE SET name = EXCLUDED.name
-                RETURNING id, sku, name;
-                """,
-                sku,
-                name,
-            )
-
-            # Ensure a stock record exists for this product.
-            # If one already exists, keep the higher quantity.
-            await conn.execute(
-                """
-                INSERT INTO stock (product_id, quantity)
-                VALUES ($1, $2)
-                ON CONFLICT (product_id) DO UPDATE SET
-                  quantity = GREATEST(stock.quantity, EXCLUDED.quantity),
-                  updated_at = now();
-                """,
-                row["id"],
-                initial_qty,
-            )
-
-            # Log the initial stock as a movement only when there is stock to add
-            if initial_qty > 0:
-                await conn.execute(
-                    """
-                    INSERT INTO stock_movements (product_id, delta, reason)
-                    VALUES ($1, $2, $3);
-                    """,
-                    row["id"],
-                    initial_qty,
-                    "initial",
-                )
+        row = await conn.fetchrow(
+            _SQL_CREATE_PRODUCT,
+            sku,
+            name,
+            initial_qty,
+        )
 
     return {"ok": True, "product": dict(row), "initial_qty": initial_qty}
@@ -10,8 +10,41 @@ All stock changes are recorded in the stock_movements table for
 auditing purposes.
 """
 
+from typing import Final
+
 from app.mcp_app import mcp
-from app.db import get_pool
+from app.db import get_pool, get_read_pool
+
+# Queries for the stock tools, defined once at import.
+_SQL_GET_STOCK: Final = """
+    SELECT p.sku, p.name, s.quantity, s.updated_at
+    FROM products p
+    JOIN stock s ON s.product_id = p.id
+    WHERE p.sku = $1;
+"""
+
+_SQL_ADD_STOCK: Final = """
+    WITH p AS (
+        SELECT id FROM products WHERE sku = $1
+    ), upd AS (
+        UPDATE stock s
+        SET quantity = s.quantity + $2::int, updated_at = now()
+        FROM p
+        WHERE s.product_id = p.id
+        AND s.quantity + $2::int >= 0
+        RETURNING s.product_id, s.quantity
+    ), mov AS (
+        INSERT INTO stock_movements (product_id, delta, reason)
+        SELECT product_id, $2::int, $3 FROM upd
+    )
+    SELECT
+        p.id AS product_id,
+        upd.quantity AS quantity_after,
+        (SELECT quantity FROM stock WHERE product_id = p.id) AS current_qty
+    FROM (SELECT 1) AS one
+    LEFT JOIN p ON TRUE
+    LEFT JOIN upd ON TRUE;
+"""
 
 
 @mcp.tool
@@ -26,28 +59,28 @@ async def get_stock(sku: str) -> dict:
         dict: Stock details (sku, name, quantity, updated_at) on success,
               or an error with "SKU_NOT_FOUND" if the product does not exist.
     """
-    pool = await get_pool()
+    pool = await get_read_pool()
 
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            """
-            SELECT p.sku, p.name, s.quantity, s.updated_at
-            FROM products p
-            JOIN stock s ON s.product_id = p.id
-            WHERE p.sku = $1;
-            """,
-            sku,
-        )
+    # Read-only single query: the pool lends a connection for just this call
+    row = await pool.fetchrow(
+        _SQL_GET_STOCK,
+        sku,
+    )
 
     if not row:
         return {"ok": False, "error": "SKU_NOT_FOUND", "sku": sku}
 
+    # Columns come back in the SELECT order, so unpack them by position
+    # rather than looking each one up by name
+    sku, name, quantity, updated_at = row
+
     return {
         "ok": True,
-        "sku": row["sku"],
-        "name": row["name"],
-        "quantity": row["quantity"],
-        "updated_at": str(row["updated_at"]),
+        "sku": sku,
+        "name": name,
+        "quantity": quantity,
+        # FastMCP encodes datetimes as ISO-8601 itself
+        "updated_at": updated_at,
     }
 
 
@@ -58,8 +91,9 @@ async def add_stock(sku: str, delta: int, reason: str = "adjustment") -> dict:
     Prevents negative stock.
 
     A positive delta increases stock; a negative delta decreases it.
-    The operation is atomic (wrapped in a transaction) and locks the
-    stock row with FOR UPDATE to avoid race conditions.
+    The update and its stock-movement entry are done by a single atomic
+    statement, which also checks the quantity so concurrent changes
+    cannot push it below zero.
 
     Args:
         sku: The product SKU to adjust.
@@ -69,69 +103,47 @@ async def add_stock(sku: str, delta: int, reason: str = "adjustment") -> dict:
 
     Returns:
         dict: The quantities before and after the change on success,
-              or an error if the SKU is not found or stock would go negative.
+              or an error if the SKU is not found, has no stock row, or
+              stock would go negative.
     """
     if delta == 0:
         return {"ok": True, "sku": sku, "quantity_change": 0}
 
     pool = await get_pool()
 
+    # Apply the change and log the movement in one statement. The UPDATE
+    # only matches when the new quantity stays >= 0; Postgres re-checks that
+    # condition against the latest row version under concurrent updates, so
+    # no explicit lock is needed. The outer LEFT JOINs always return one row
+    # telling apart "unknown SKU" from "not enough stock".
     async with pool.acquire() as conn:
-        async with conn.transaction():
-            # Find the product by SKU
-            prod = await conn.fetchrow(
-                "SELECT id, sku, name FROM products WHERE sku = $1;",
-                sku,
-            )
-
-            if not prod:
-                return {"ok": False, "error": "SKU_NOT_FOUND", "sku": sku}
-
-            # Lock the stock row to prevent concurrent modifications
-            stock_row = await conn.fetchrow(
-                """
-                SELECT quantity
-                FROM stock
-                WHERE product_id = $1
-                FOR UPDATE;
-                """,
-                prod["id"],
-            )
-
-            current_qty = stock_row["quantity"] if stock_row else 0
-            new_qty = current_qty + int(delta)
-
-            # Prevent stock from going below zero
-            if new_qty < 0:
-                return {
-                    "ok": False,
-                    "error": "INSUFFICIENT_STOCK",
-                    "sku": sku,
-                    "current_qty": current_qty,
-                    "requested_delta": delta,
-                }
-
-            # Apply the new quantity
-            await conn.execute(
-                """
-                UPDATE stock
-                SET quantity = $2, updated_at = now()
-                WHERE product_id = $1;
-                """,
-                prod["id"],
-                new_qty,
-            )
-
-            # Record the movement for audit purposes
-            await conn.execute(
-                """
-                INSERT INTO stock_movements (product_id, delta, reason)
-                VALUES ($1, $2, $3);
-                """,
-                prod["id"],
-                int(delta),
-                reason,
-            )
+        row = await conn.fetchrow(
+            _SQL_ADD_STOCK,
+            sku,
+            int(delta),
+            reason,
+        )
+
+    product_id, new_qty, current_qty = row
+
+    if product_id is None:
+        return {"ok": False, "error": "SKU_NOT_FOUND", "sku": sku}
+
+    # The product exists but has no stock row to update
+    if current_qty is None:
+        return {"ok": False, "error": "STOCK_ROW_MISSING", "sku": sku}
+
+    # Nothing was updated: the stock would have gone below zero
+    if new_qty is None:
+        return {
+            "ok": False,
+            "error": "INSUFFICIENT_STOCK",
+            "sku": sku,
+            "current_qty": current_qty,
+            "requested_delta": delta,
+        }
+
+    current_qty = new_qty - int(delta)
 
     return {
         "ok": True,